@@ -38,9 +38,10 @@ in how everything works, read on.
 #    <path> element, and assign fill/stroke style attributes to the <path>.
 
 
-from collections import defaultdict
+from functools import lru_cache
 import re
 from typing import Iterator, List, Tuple
+import weakref
 import xml.etree.ElementTree as ET
 
 
@@ -66,37 +67,48 @@ import xml.etree.ElementTree as ET
 #  * "select" is also just a hint for Animate, but it appears in "edges", so we
 #    include it for completeness.
 #
-# Anyhow, this language can actually be tokenized with a single regex, which is
-# faster than using Lark:
-
-EDGE_TOKENIZER = re.compile(
-    r"""
-[!|/[\]]                |   # Move to, line to, quad to
-(?<!S)-?\d+(?:\.\d+)?   |   # Decimal number
-\#[A-Z0-9]+\.[A-Z0-9]+      # Hex number
+# Anyhow, this language can actually be parsed with a single regex, which is
+# faster than using Lark. Each match is one command along with its numbers:
+
+NUMBER = r"(-?\d+(?:\.\d+)?|\#[A-Z0-9]+\.[A-Z0-9]+)"
+EDGE_COMMAND = re.compile(
+    rf"""
+([!|/[\]])                  # Move to, line to, quad to
+\s*{NUMBER}\s*{NUMBER}       # Destination (or control point for quad to)
+(?:\s*{NUMBER}\s*{NUMBER})?  # Destination (quad to only)
 """,
     re.VERBOSE,
 )
 
 # Notes:
-#   * Whitespace is automatically ignored, as we only match what we want.
-#   * The negative lookbehind assertion (?<!S) is needed to avoid matching the
-#     digit in select commands as a number.
+#   * Whitespace and select commands are automatically ignored, as we only
+#     match what we want. (A select command can't start a match, as it doesn't
+#     begin with a command character.)
+#   * Matching whole commands means that the regex engine, not Python code,
+#     groups numbers into points. We also don't need a separate token for each
+#     command and number.
+#   * The numbers are "decimal | hex", where decimal is /-?\d+(\.\d+)?/ and
+#     hex is a "#" followed by hex digits, a ".", and more hex digits.
 
 
-# After tokenizing, we need to parse numbers:
+# After matching commands, we need to parse numbers. Coordinates repeat a lot
+# (e.g. segments share endpoints), so we cache the results:
 
 
+@lru_cache(maxsize=65536)
 def parse_number(num: str) -> float:
     """Parse an XFL edge format number."""
     if num[0] == "#":
         # Signed, 32-bit fixed-point number in hex
-        parts = num[1:].split(".")
-        # Pad to 8 digits
-        hex_num = "{:>06}{:<02}".format(*parts)
-        num = int.from_bytes(bytes.fromhex(hex_num), "big", signed=True)
-        # Account for hex scaling and Animate's 20x scaling (twips)
-        return (num / 256) / 20
+        integer, fraction = num[1:].split(".")
+        # The fractional part is left-aligned (i.e. "#1.8" is 0x1.80)
+        num = int(integer, 16) << 8 | int(fraction.ljust(2, "0"), 16)
+        # Sign-extend
+        if num & 0x8000_0000:
+            num -= 0x1_0000_0000
+        # Account for hex scaling and Animate's 20x scaling (twips). Dividing
+        # by 256 is exact, so a single division gives the same result.
+        return num / (256 * 20)
     else:
         # Decimal number. Account for Animate's 20x scaling (twips)
         return float(num) / 20
@@ -144,10 +156,14 @@ def parse_number(num: str) -> float:
 #
 #    [E, D, (C,), B, A]
 #
-# In practice, each point is represented as a coordinate string, so the actual
+# In practice, each point is represented as a tuple of floats, so the actual
 # point list might look like:
 #
-#   ["0 0", "10 0", ("20 10",), "30 0", "40 0"]
+#   [(0.0, 0.0), (10.0, 0.0), ((20.0, 10.0),), (30.0, 0.0), (40.0, 0.0)]
+#
+# Float tuples are cheap to hash and compare, which matters since endpoints are
+# used as dict keys when joining segments. They are only converted to strings
+# when writing SVG.
 #
 # This next function converts the XFL edge format into point lists. Since each
 # "edges" attribute can contain multiple segments, but each point list only
@@ -163,47 +179,52 @@ def edge_format_to_point_lists(edges: str) -> Iterator[list]:
     Yields:
         One point list for each segment parsed out of `edges`
     """
-    tokens = iter(EDGE_TOKENIZER.findall(edges))
+    # Stream commands instead of using findall(), which would build a list of
+    # every command in `edges` before we start.
+    commands = EDGE_COMMAND.finditer(edges)
     point_list = []
 
-    def next_point():
-        x = parse_number(next(tokens))
-        y = parse_number(next(tokens))
-        return x, y
-
-    assert next(tokens) == "!", "Edge format must start with moveto (!) command"
-
-    prev_point = next_point()
-
-    try:
-        while True:
-            command = next(tokens)
-            curr_point = next_point()
-
-            if command == "!":
-                # Move to
-                if curr_point != prev_point:
-                    # If a move command doesn't change the current point, we
-                    # ignore it. Otherwise, a new segment is starting, so we
-                    # must yield the current point list and begin a new one.
-                    yield point_list
-                    point_list = []
-                    prev_point = curr_point
-            elif command in "|/":
-                # Line to
-                point_list.append((prev_point[0], prev_point[1]))
-                point_list.append((curr_point[0], curr_point[1]))
+    command, x, y, _, _ = next(commands).groups()
+    assert command == "!", "Edge format must start with moveto (!) command"
+    prev_point = parse_number(x), parse_number(y)
+
+    for match in commands:
+        command, x, y, end_x, end_y = match.groups()
+        curr_point = parse_number(x), parse_number(y)
+
+        if command == "!":
+            # Move to
+            if curr_point != prev_point:
+                # If a move command doesn't change the current point, we
+                # ignore it. Otherwise, a new segment is starting, so we must
+                # yield the current point list and begin a new one.
+                yield point_list
+                point_list = []
                 prev_point = curr_point
-            else:
-                # Quad to. The control point (curr_point) is marked by putting
-                # it in a tuple.
-                end_point = next_point()
-                point_list.append((prev_point[0], prev_point[1]))
-                point_list.append(((curr_point[0], curr_point[1]),))
-                point_list.append((end_point[0], end_point[1]))
-                prev_point = end_point
-    except StopIteration:
-        yield point_list
+        elif command in "|/":
+            # Line to. Points are immutable tuples, so we can append them
+            # as-is instead of copying.
+            point_list.append(prev_point)
+            point_list.append(curr_point)
+            prev_point = curr_point
+        else:
+            # Quad to. The control point (curr_point) is marked by putting it
+            # in a tuple.
+            end_point = parse_number(end_x), parse_number(end_y)
+            point_list.append(prev_point)
+            point_list.append((curr_point,))
+            point_list.append(end_point)
+            prev_point = end_point
+
+    yield point_list
+
+
+# The same shape is usually converted many times (e.g. once per frame of a
+# symbol, or with different color effects), so we cache the edges of each
+# <DOMShape>. The keys are weak references, so the cache grows with the
+# document and is freed along with it. Paths are tuples since the cached
+# results are shared.
+EDGE_CACHE = weakref.WeakKeyDictionary()
 
 
 def xfl_domshape_to_edges(domshape: ET.Element) -> List[Tuple]:
@@ -215,33 +236,44 @@ def xfl_domshape_to_edges(domshape: ET.Element) -> List[Tuple]:
     Returns a list of tuples, each containing a path, left fill, right fill, and stroke:
         [(path, fill_id_left, fill_id_right, stroke_id), ...]
     """
-    fill_edges = []
-    stroke_edges = []
-    stroke_paths = defaultdict(list)
+    edges = EDGE_CACHE.get(domshape)
+    if edges is None:
+        edges = EDGE_CACHE[domshape] = list(parse_domshape_edges(domshape))
+    return edges
+
+
+def parse_domshape_edges(domshape: ET.Element) -> Iterator[Tuple]:
+    """Uncached version of `xfl_domshape_to_edges()` which yields edges."""
     edges_element = domshape.find("{*}edges")
+    if edges_element is None:
+        return
+
+    # <Edge> elements are direct children of <edges>, so we iterate over them
+    # instead of using iterfind(), which is much slower.
+    for edge in edges_element:
+        attrib = edge.attrib
+        edge_format = attrib.get("edges")
+        # Ignore the "cubics" attribute, as it's only used by Animate
+        if edge_format is None:
+            continue
 
-    # Ignore the "cubics" attribute, as it's only used by Animate
-    for edge in edges_element.iterfind(".//{*}Edge[@edges]"):
-        edge_format = edge.get("edges")
-        fill_id_left = edge.get("fillStyle0")
-        fill_id_right = edge.get("fillStyle1")
-        stroke_id = edge.get("strokeStyle")
+        fill_id_left = attrib.get("fillStyle0")
+        fill_id_right = attrib.get("fillStyle1")
+        stroke_id = attrib.get("strokeStyle")
 
-        for path in edge_format_to_point_lists(edge_format):
-            yield tuple(path), fill_id_left, fill_id_right, stroke_id
+        for point_list in edge_format_to_point_lists(edge_format):
+            yield tuple(point_list), fill_id_left, fill_id_right, stroke_id
 
 
 def xfl_domshape_to_visible_edges(domshape, known_fills, known_strokes):
     """Wrapper for xfl_domshape_to_edges to skip over unknown fills and strokes."""
 
-    for shape_piece in xfl_domshape_to_edges(domshape):
-        path, fill_id_left, fill_id_right, stroke_id = shape_piece
-        if fill_id_left not in known_fills:
-            fill_id_left = None
-        if fill_id_right not in known_fills:
-            fill_id_right = None
-        if stroke_id not in known_strokes:
-            stroke_id = None
+    # `known_fills` and `known_strokes` are style dicts, so membership tests
+    # are O(1)
+    for path, fill_id_left, fill_id_right, stroke_id in xfl_domshape_to_edges(domshape):
+        fill_id_left = fill_id_left if fill_id_left in known_fills else None
+        fill_id_right = fill_id_right if fill_id_right in known_fills else None
+        stroke_id = stroke_id if stroke_id in known_strokes else None
 
         if fill_id_left or fill_id_right or stroke_id:
             yield path, fill_id_left, fill_id_right, stroke_id
@@ -2,15 +2,91 @@
 
 
 from dataclasses import dataclass
-import math, numpy
-from typing import List, Tuple
+from functools import lru_cache
+from hashlib import blake2b
+import math
+from operator import itemgetter
+import sys
+from typing import Tuple
 import xml.etree.ElementTree as ET
 
 from xfl2svg.util import check_known_attrib, get_matrix, Traceable
 
 
+def gradient_id(fields):
+    """Create a unique ID for a gradient from its fields."""
+    # hash() of a string is randomized per process, so hash(self) gave
+    # different IDs on every run. The repr() of the fields is deterministic.
+    digest = blake2b(repr(fields).encode(), digest_size=4).hexdigest()
+    return f"Gradient_{digest}"
+
+
+# Documents tend to reuse the same few gradients across many shapes, so we
+# share one instance per unique gradient instead of creating a new one for
+# every fill and stroke.
+
+
+@lru_cache(maxsize=1024)
+def shared_gradient(cls, *fields):
+    """Get the instance of gradient class `cls` with the given fields."""
+    return cls(*fields)
+
+
+def parse_gradient_stops(element):
+    """Parse the <GradientEntry> children of an XFL gradient into stops."""
+    stops = []
+    # <GradientEntry> elements are direct children, so we check tags while
+    # iterating instead of using iterfind(), which is much slower
+    for entry in element:
+        if not entry.tag.endswith("GradientEntry"):
+            continue
+        check_known_attrib(entry, {"ratio", "color", "alpha"})
+        # Only call float() on an alpha that's actually there. A missing (or
+        # empty) alpha is fully opaque. Colors repeat across gradients, so
+        # they're interned to share one copy of each string.
+        alpha = entry.get("alpha")
+        stops.append(
+            (
+                float(entry.get("ratio")) * 100,
+                sys.intern(entry.get("color", "#000000")),
+                float(alpha) if alpha else 1.0,
+            )
+        )
+    # SVG expects stop offsets in increasing order
+    stops.sort(key=itemgetter(0))
+    return stops
+
+
+def xfl_gradient_entries(stops):
+    """Convert gradient stops into XFL <GradientEntry> elements."""
+    return [
+        f'<GradientEntry color="{color}" alpha="{alpha}" ratio="{ratio / 100}"/>'
+        for ratio, color, alpha in stops
+    ]
+
+
+def svg_gradient(tag, attrib, stops):
+    """Create an SVG gradient element with a <stop> for each gradient stop."""
+    # TreeBuilder creates the elements in C, which is faster than calling
+    # SubElement() for each stop
+    builder = ET.TreeBuilder()
+    builder.start(tag, attrib)
+    for offset, color, alpha in stops:
+        stop_attrib = {"offset": f"{offset}%", "stop-color": color}
+        if alpha != 1:
+            stop_attrib["stop-opacity"] = str(alpha)
+        builder.start("stop", stop_attrib)
+        builder.end("stop")
+    builder.end(tag)
+    return builder.close()
+
+
 @dataclass(frozen=True)
 class LinearGradient(Traceable):
+    # Gradients are created for every gradient fill and stroke, so skip the
+    # per-instance __dict__. (dataclass(slots=True) requires Python 3.10.)
+    __slots__ = ("matrix", "stops", "spread_method", "_hash", "_id")
+
     matrix: Tuple[float]
     stops: Tuple[Tuple[float, str, float], ...]
     spread_method: str
@@ -48,21 +124,12 @@ class LinearGradient(Traceable):
             ty - b * 16384 / 20,
         )
 
-        stops = []
-        for entry in element.iterfind("{*}GradientEntry"):
-            check_known_attrib(entry, {"ratio", "color", "alpha"})
-            stops.append(
-                (
-                    float(entry.get("ratio")) * 100,
-                    entry.get("color", "#000000"),
-                    float(entry.get("alpha") or 1),
-                )
-            )
+        stops = parse_gradient_stops(element)
 
         check_known_attrib(element, {"spreadMethod", "interpolationMethod"})
-        spread_method = element.get("spreadMethod", "pad")
+        spread_method = sys.intern(element.get("spreadMethod", "pad"))
 
-        return cls(normalized_matrix, tuple(stops), spread_method)
+        return shared_gradient(cls, normalized_matrix, tuple(stops), spread_method)
 
     def to_xfl(self, document_dims=None):
         # TODO: figure out how to calculate c and d matrix elements
@@ -73,24 +140,17 @@ class LinearGradient(Traceable):
         tx = self.matrix[4] + a * 16384 / 20
         ty = self.matrix[5] + b * 16384 / 20
 
-        gradient_entries = []
-        for ratio, color, alpha in self.stops:
-            gradient_entries.append(
-                f"""
-                <GradientEntry color="{color}" alpha="{alpha}" ratio="{ratio/100}" />
-            """
-            )
-
-        result = f"""
-            <LinearGradient spreadMethod="{self.spread_method}">
-                <matrix>
-                    <Matrix a="{a}" b="{b}" c="{c}" d="{d}" tx="{tx}" ty="{ty}"/>
-                </matrix>
-                {''.join(gradient_entries)}
-
-            </LinearGradient>
-        """
-        return result
+        # Build the element from a flat list of parts and join them once,
+        # rather than formatting each entry and then the whole element
+        parts = [
+            f'<LinearGradient spreadMethod="{self.spread_method}">',
+            "<matrix>",
+            f'<Matrix a="{a}" b="{b}" c="{c}" d="{d}" tx="{tx}" ty="{ty}"/>',
+            "</matrix>",
+        ]
+        parts.extend(xfl_gradient_entries(self.stops))
+        parts.append("</LinearGradient>")
+        return "".join(parts)
 
     @classmethod
     def from_dict(cls, d):
@@ -111,74 +171,81 @@ class LinearGradient(Traceable):
             "linearGradient": {
                 "gradientTransform": list(self.matrix),
                 "spreadMethod": self.spread_method,
-                "stops": [],
+                "stops": [
+                    {
+                        "offset": offset,
+                        "stop-color": color,
+                        "stop-opacity": alpha if alpha is not None else 1,
+                    }
+                    for offset, color, alpha in self.stops
+                ],
             }
         }
 
-        for offset, color, alpha in self.stops:
-            attrib = {"offset": offset, "stop-color": color}
-            if alpha is not None:
-                attrib["stop-opacity"] = alpha
-            else:
-                attrib["stop-opacity"] = 1
-            result["linearGradient"]["stops"].append(attrib)
-
         return result
 
     def to_svg(self, canvas_dims=(864, 486)):
         """Create an SVG <linearGradient> element from a LinearGradient."""
-        matrix = (
-            str(x)
-            for x in [
-                self.matrix[0] / canvas_dims[0],
-                self.matrix[1] / canvas_dims[0],
-                self.matrix[2] / canvas_dims[1],
-                self.matrix[3] / canvas_dims[1],
-                self.matrix[4],
-                self.matrix[5],
-            ]
-        )
+        a, b, c, d, tx, ty = self.matrix
+
+        def svg_matrix(canvas_dims):
+            # Keep dividing instead of multiplying by reciprocals, which would
+            # change the last digit of some results
+            w, h = canvas_dims
+            return f"matrix({a / w},{b / w},{c / h},{d / h},{tx},{ty})"
 
-        element = ET.Element(
+        element = svg_gradient(
             "linearGradient",
             {
                 "id": self.id,
                 "gradientUnits": "userSpaceOnUse",
-                "gradientTransform": f"matrix({','.join(matrix)})",
+                "gradientTransform": svg_matrix(canvas_dims),
                 "spreadMethod": self.spread_method,
             },
+            self.stops,
         )
-        for offset, color, alpha in self.stops:
-            attrib = {"offset": f"{offset}%", "stop-color": color}
-            if alpha != 1:
-                attrib["stop-opacity"] = str(alpha)
-            ET.SubElement(element, "stop", attrib)
 
         def _update_fn(canvas_dims):
-            matrix = (
-                str(x)
-                for x in [
-                    self.matrix[0] / canvas_dims[0],
-                    self.matrix[1] / canvas_dims[0],
-                    self.matrix[2] / canvas_dims[1],
-                    self.matrix[3] / canvas_dims[1],
-                    self.matrix[4],
-                    self.matrix[5],
-                ]
-            )
-
-            element.set("gradientTransform", f"matrix({','.join(matrix)})")
+            element.set("gradientTransform", svg_matrix(canvas_dims))
 
         return element, _update_fn
 
+    def __post_init__(self):
+        # Gradients are immutable, so compute the hash and ID once (from the
+        # same fields that __reduce__() passes to __init__)
+        fields = self.__reduce__()[1]
+        object.__setattr__(self, "_hash", hash(fields))
+        object.__setattr__(self, "_id", gradient_id(fields))
+
+    def __reduce__(self):
+        # Frozen instances with __slots__ can't be unpickled or copied by
+        # setting attributes, so recreate them with __init__ instead
+        return type(self), (self.matrix, self.stops, self.spread_method)
+
+    def __hash__(self):
+        # dataclass() keeps an explicit __hash__, so this replaces the
+        # generated one that rehashes every field on each call
+        return self._hash
+
     @property
     def id(self):
         """Unique ID used to dedup SVG elements in <defs>."""
-        return f"Gradient_{hash(self) & 0xFFFF_FFFF:08x}"
+        return self._id
 
 
 @dataclass(frozen=True)
 class RadialGradient(Traceable):
+    __slots__ = (
+        "matrix",
+        "radius",
+        "focal_point",
+        "stops",
+        "spread_method",
+        "_hash",
+        "_id",
+        "_svg_attrib",
+    )
+
     matrix: Tuple[float, ...]
     radius: float
     focal_point: float
@@ -188,7 +255,7 @@ class RadialGradient(Traceable):
     @classmethod
     def from_xfl(cls, element, document_dims):
         a, b, c, d, tx, ty = map(float, get_matrix(element))
-        norm = (a**2 + b**2) ** 0.5
+        norm = math.hypot(a, b)
         radius = 16384 / 20 * norm
 
         # NOTE: this might require radius as calculated from the bounding box
@@ -203,25 +270,17 @@ class RadialGradient(Traceable):
             svg_d = d / norm
             svg_matrix = (svg_a, svg_b, svg_c, svg_d, tx, ty)
 
-        stops = []
-        for entry in element.iterfind("{*}GradientEntry"):
-            check_known_attrib(entry, {"ratio", "color", "alpha"})
-            stops.append(
-                (
-                    float(entry.get("ratio")) * 100,
-                    entry.get("color", "#000000"),
-                    float(entry.get("alpha") or 1),
-                )
-            )
-        stops = sorted(stops, key=lambda x: x[0])
+        stops = parse_gradient_stops(element)
 
         # TODO: interpolationMethod
         check_known_attrib(
             element, {"spreadMethod", "focalPointRatio", "interpolationMethod"}
         )
-        spread_method = element.get("spreadMethod", "pad")
+        spread_method = sys.intern(element.get("spreadMethod", "pad"))
 
-        return cls(svg_matrix, radius, focal_point, tuple(stops), spread_method)
+        return shared_gradient(
+            cls, svg_matrix, radius, focal_point, tuple(stops), spread_method
+        )
 
     def to_xfl(self, **kwargs):
         norm = self.radius / (16384 / 20)
@@ -233,24 +292,16 @@ class RadialGradient(Traceable):
         tx = self.matrix[4]
         ty = self.matrix[5]
 
-        gradient_entries = []
-        for ratio, color, alpha in self.stops:
-            gradient_entries.append(
-                f"""
-                <GradientEntry color="{color}" alpha="{alpha}" ratio="{ratio/100}" />
-            """
-            )
-
-        result = f"""
-            <RadialGradient focalPointRatio="{self.focal_point / self.radius}" spreadMethod="{self.spread_method}">
-                <matrix>
-                    <Matrix a="{a}" b="{b}" c="{c}" d="{d}" tx="{tx}" ty="{ty}"/>
-                </matrix>
-                {''.join(gradient_entries)}
-
-            </RadialGradient>
-        """
-        return result
+        parts = [
+            f'<RadialGradient focalPointRatio="{self.focal_point / self.radius}" '
+            f'spreadMethod="{self.spread_method}">',
+            "<matrix>",
+            f'<Matrix a="{a}" b="{b}" c="{c}" d="{d}" tx="{tx}" ty="{ty}"/>',
+            "</matrix>",
+        ]
+        parts.extend(xfl_gradient_entries(self.stops))
+        parts.append("</RadialGradient>")
+        return "".join(parts)
 
     @classmethod
     def from_dict(cls, d):
@@ -277,46 +328,62 @@ class RadialGradient(Traceable):
                 "fx": self.focal_point,
                 "gradientTransform": list(matrix),
                 "spreadMethod": self.spread_method,
-                "stops": [],
+                "stops": [
+                    {
+                        "offset": offset,
+                        "stop-color": color,
+                        "stop-opacity": alpha if alpha is not None else 1,
+                    }
+                    for offset, color, alpha in self.stops
+                ],
             }
         }
 
-        for offset, color, alpha in self.stops:
-            attrib = {"offset": offset, "stop-color": color}
-            if alpha is not None:
-                attrib["stop-opacity"] = alpha
-            else:
-                attrib["stop-opacity"] = 1
-            result["radialGradient"]["stops"].append(attrib)
-
         return result
 
     def to_svg(self, *args, **kwargs):
         """Create an SVG <linearGradient> element from a LinearGradient."""
-        matrix = map(str, self.matrix)
-        element = ET.Element(
-            "radialGradient",
-            {
-                "id": self.id,
-                "gradientUnits": "userSpaceOnUse",
-                "cx": "0",
-                "cy": "0",
-                "r": str(self.radius),
-                "fx": str(self.focal_point),
-                "fy": "0",
-                "gradientTransform": f"matrix({','.join(matrix)})",
-                "spreadMethod": self.spread_method,
-            },
-        )
-        for offset, color, alpha in self.stops:
-            attrib = {"offset": f"{offset}%", "stop-color": color}
-            if alpha != 1:
-                attrib["stop-opacity"] = str(alpha)
-            ET.SubElement(element, "stop", attrib)
+        # Copy the attributes so that changes to the element don't leak into
+        # the cached dict
+        element = svg_gradient("radialGradient", self._svg_attrib.copy(), self.stops)
 
         return element, None
 
+    def __post_init__(self):
+        # Gradients are immutable, so compute the hash and ID once (from the
+        # same fields that __reduce__() passes to __init__)
+        fields = self.__reduce__()[1]
+        object.__setattr__(self, "_hash", hash(fields))
+        object.__setattr__(self, "_id", gradient_id(fields))
+        # Unlike linear gradients, none of the SVG attributes depend on the
+        # canvas size, so they only need to be formatted once
+        matrix = ",".join(map(str, self.matrix))
+        svg_attrib = {
+            "id": self._id,
+            "gradientUnits": "userSpaceOnUse",
+            "cx": "0",
+            "cy": "0",
+            "r": str(self.radius),
+            "fx": str(self.focal_point),
+            "fy": "0",
+            "gradientTransform": f"matrix({matrix})",
+            "spreadMethod": self.spread_method,
+        }
+        object.__setattr__(self, "_svg_attrib", svg_attrib)
+
+    def __reduce__(self):
+        return type(self), (
+            self.matrix,
+            self.radius,
+            self.focal_point,
+            self.stops,
+            self.spread_method,
+        )
+
+    def __hash__(self):
+        return self._hash
+
     @property
     def id(self):
         """Unique ID used to dedup SVG elements in <defs>."""
-        return f"Gradient_{hash(self) & 0xFFFF_FFFF:08x}"
+        return self._id
@@ -3,9 +3,11 @@
 from collections import defaultdict
 import copy
 from functools import reduce
+from itertools import chain
 import json
 from sre_parse import expand_template
 import warnings
+import weakref
 import xml.etree.ElementTree as ET
 
 from xfl2svg.shape.edge import xfl_domshape_to_edges, xfl_domshape_to_visible_edges
@@ -35,18 +37,19 @@ def svg_normalize_style(d):
 def path_to_svg_format(point_list: list) -> str:
     """Convert a point list into the SVG path format."""
     point_iter = iter(point_list)
-    path = ["M"]
-    points = []
+    x, y = next(point_iter)
+    path = ["M", f"{x} {y}"]
     last_command = "M"
 
-    def append_point(pt):
-        path.append(f"{pt[0]} {pt[1]}")
-
-    append_point(next(point_iter))
-
-    try:
-        while True:
-            point = next(point_iter)
+    if len(point_list) > 1 and not any(
+        isinstance(point[0], tuple) for point in point_list
+    ):
+        # Fast path: many paths (e.g. rectangles) only have lines, so every
+        # point after the first can follow a single "L" command
+        path.append("L")
+        path.extend([f"{x} {y}" for x, y in point_iter])
+    else:
+        for point in point_iter:
             command = "Q" if isinstance(point[0], tuple) else "L"
             # SVG lets us omit the command letter if we use the same command
             # multiple times in a row.
@@ -56,24 +59,27 @@ def path_to_svg_format(point_list: list) -> str:
 
             if command == "Q":
                 # Append control point and destination point
-                append_point(point[0])
-                append_point(next(point_iter))
+                cx, cy = point[0]
+                x, y = next(point_iter)
+                path.append(f"{cx} {cy} {x} {y}")
             else:
-                append_point(point)
-    except StopIteration:
-        if point_list[0] == point_list[-1]:
-            # Animate adds a "closepath" (Z) command to every filled shape and
-            # closed stroke. For shapes, it makes no difference, but for closed
-            # strokes, it turns two overlapping line caps into a bevel, miter,
-            # or round join, which does make a difference.
-            # TODO: It is likely that closed strokes can be broken into
-            # segments and spread across multiple Edge elements, which would
-            # require a function like point_lists_to_shapes(), but for strokes.
-            # For now, though, adding "Z" to any stroke that is already closed
-            # seems good enough.
-            # path.append("Z")
-            pass
-        return " ".join(path)
+                x, y = point
+                path.append(f"{x} {y}")
+
+    if point_list[0] == point_list[-1]:
+        # Animate adds a "closepath" (Z) command to every filled shape and
+        # closed stroke. For shapes, it makes no difference, but for closed
+        # strokes, it turns two overlapping line caps into a bevel, miter,
+        # or round join, which does make a difference.
+        # TODO: It is likely that closed strokes can be broken into
+        # segments and spread across multiple Edge elements, which would
+        # require a function like point_lists_to_shapes(), but for strokes.
+        # For now, though, adding "Z" to any stroke that is already closed
+        # seems good enough.
+        # path.append("Z")
+        pass
+
+    return " ".join(path)
 
 
 # We can convert edges (segment path + color) into SVG <path> elements. The algorithm
@@ -102,7 +108,7 @@ def path_to_svg_format(point_list: list) -> str:
 #       "strokeStyle" attribute, so we don't need to reverse any segments.
 #     * Use all paths directly. There's no need to split them into groups.
 #
-# The PathGraph class implements the algorithm to find covering cycles and paths.
+# The PathGraph class implements the algorithm to find covering cycles.
 # the ShapeGraph class collects paths by their fill and stroke id.#
 #
 # Assumptions:
@@ -131,7 +137,9 @@ def path_to_svg_format(point_list: list) -> str:
 class ShapeGraph:
     def __init__(self):
         self.fills = defaultdict(PathGraph)
-        self.strokes = defaultdict(PathGraph)
+        # Strokes don't need cycles, just the paths without duplicates. Dict
+        # keys keep them unique and in the order they were added.
+        self.strokes = defaultdict(dict)
 
     def add_edge(self, path, fill_left, fill_right, stroke):
         if fill_left != None:
@@ -141,28 +149,30 @@ class ShapeGraph:
             self.fills[fill_right].add(path[::-1])
 
         if stroke != None:
-            self.strokes[stroke].add(path)
+            self.strokes[stroke][path] = None
 
     def get_fills(self):
         for fill_id, g in self.fills.items():
-            point_lists = []
-            for cycle in g.covering_cycles():
-                next_pl = []
-                for path in cycle:
-                    next_pl.extend(path)
-                point_lists.append(next_pl)
+            point_lists = [
+                tuple(chain.from_iterable(cycle)) for cycle in g.covering_cycles()
+            ]
             yield fill_id, point_lists
 
     def get_strokes(self):
-        for stroke_id, g in self.strokes.items():
-            yield stroke_id, g.covering_paths()
+        for stroke_id, paths in self.strokes.items():
+            yield stroke_id, list(paths)
 
 
 class PathGraph:
     """This class represents a graph of paths.
 
     Each path (tuple of points and control points) is represented as a vertex.
-    There exists an PathGraph edge from A to B if A ends where B starts.
+    There exists an PathGraph edge from A to B if A ends where B starts. Edges
+    aren't stored: the successors of A are just the paths starting at A's end.
+
+    Vertices are integer IDs rather than the paths themselves. Tuple hashes
+    aren't cached, so using paths directly would rehash every point of a path
+    on each set and dict access.
 
     This class is used to find a set of cycles that covers all given paths.
     """
@@ -170,65 +180,78 @@ class PathGraph:
     def __init__(self):
         # Standard graph data
         self.vertices = set()
-        self.paths = defaultdict(set)
 
-        # Vertices "behind" a given target node
-        self.tails = defaultdict(set)
+        # Mapping between paths and their vertex IDs
+        self.vertex_ids = {}
+        self.vertex_paths = []
+
         # Vertices "in front of" a given source node
         self.heads = defaultdict(set)
 
     def add(self, path=None):
-        source = path[0]
-        target = path[-1]
-
-        self.vertices.add(path)
+        if path in self.vertex_ids:
+            # Adding a path twice doesn't change the graph
+            return
 
-        self.heads[source].add(path)
-        self.tails[target].add(path)
+        vertex = len(self.vertex_paths)
+        self.vertex_ids[path] = vertex
+        self.vertex_paths.append(path)
 
-        for incoming in self.tails[source]:
-            self.paths[incoming].add(path)
+        self.vertices.add(vertex)
+        self.heads[path[0]].add(vertex)
 
-        for outgoing in self.heads[target]:
-            self.paths[path].add(outgoing)
+    def successors(self, v):
+        return self.heads.get(self.vertex_paths[v][-1], ())
 
     def get_cycle(self, v):
         """Find a cycle by building a spanning tree.
 
-        This function builds a spanning tree rooted in vertex v until it hits v again. It
-        then returns the discovered path from v to v.
+        This function builds a spanning tree rooted in vertex v until it finds an edge
+        back to v. It then returns the discovered path from v to v.
         """
         parents = {}
         pending = set()
 
-        for child in self.paths[v]:
+        for child in self.successors(v):
             parents[child] = v
             pending.add(child)
 
-        while pending:
+        # Stop as soon as we find an edge back to v. A parent is never
+        # overwritten, so searching further couldn't change the cycle.
+        while pending and v not in parents:
             curr_vertex = pending.pop()
-            if curr_vertex == v:
-                break
-
-            for child in self.paths[curr_vertex]:
+            for child in self.successors(curr_vertex):
                 if child in parents:
                     continue
                 parents[child] = curr_vertex
+                if child == v:
+                    break
                 pending.add(child)
 
         if v not in parents:
             # Exhausted all possibilities without finding a cycle.
             return []
 
+        # Walk the parents back from v, then reverse once. (Inserting at the
+        # front of the list instead would make this quadratic.)
         result = [v]
         next_node = parents[v]
         while next_node != v:
-            result.insert(0, next_node)
+            result.append(next_node)
             next_node = parents[next_node]
 
+        result.reverse()
         return result
 
     def covering_cycles(self):
+        if len(self.vertex_paths) == 1:
+            # Fast path: most fills are a single closed path, which we can
+            # check directly without searching for cycles
+            path = self.vertex_paths[0]
+            if path[0] == path[-1]:
+                yield [path]
+            return
+
         # Make sure every path (vertex in the PathGraph) gets used at least once
         pending = self.vertices.copy()
 
@@ -238,13 +261,8 @@ class PathGraph:
             if not cycle:
                 continue
 
-            yield cycle
-            for v in cycle:
-                if v in pending:
-                    pending.remove(v)
-
-    def covering_paths(self):
-        return self.vertices
+            yield [self.vertex_paths[v] for v in cycle]
+            pending.difference_update(cycle)
 
 
 # When all segments have been joined into shapes and converted,
@@ -254,7 +272,31 @@ class PathGraph:
 # the <path>. This is done by shape_graph_to_svg.
 
 
+def shape_graph_to_path_data(shape):
+    """Join the segments of a ShapeGraph and convert them to SVG path data.
+
+    Returns a tuple:
+        fills: List of (fill_id, SVG path data, point lists)
+        strokes: List of (stroke_id, SVG path data, point lists)
+    """
+    fills = []
+    for fill_id, paths in shape.get_fills():
+        if paths:
+            fills.append((fill_id, " ".join(map(path_to_svg_format, paths)), paths))
+
+    strokes = []
+    for stroke_id, paths in shape.get_strokes():
+        if paths:
+            strokes.append((stroke_id, " ".join(map(path_to_svg_format, paths)), paths))
+
+    return fills, strokes
+
+
 def shape_graph_to_svg(shape, fill_styles, stroke_styles):
+    return path_data_to_svg(shape_graph_to_path_data(shape), fill_styles, stroke_styles)
+
+
+def path_data_to_svg(path_data, fill_styles, stroke_styles):
     fills = {}
     strokes = {}
     extra_defs = {}
@@ -289,27 +331,20 @@ def shape_graph_to_svg(shape, fill_styles, stroke_styles):
             updaters.extend(update_fns)
         return strokes[index]
 
-    for fill_id, paths in shape.get_fills():
-        paths = list(paths)
-        if not paths:
-            continue
-
+    fill_data, stroke_data = path_data
+    for fill_id, d, paths in fill_data:
         fill_style = require_fill(fill_id)
         path = ET.Element("path", fill_style)
-        path.set("d", " ".join(path_to_svg_format(pl) for pl in paths))
+        path.set("d", d)
         fill_paths.append(path)
 
         all_paths.extend((x, 0) for x in paths)
 
-    for stroke_id, paths in shape.get_strokes():
-        paths = list(paths)
-        if not paths:
-            continue
-
+    for stroke_id, d, paths in stroke_data:
         stroke_style = require_stroke(stroke_id)
         stroke_width = float(stroke_style.get("stroke-width", 1))
         stroke = ET.Element("path", stroke_style)
-        stroke.set("d", " ".join(path_to_svg_format(pl) for pl in paths))
+        stroke.set("d", d)
         stroke_paths.append(stroke)
 
         all_paths.extend((x, stroke_width) for x in paths)
@@ -329,17 +364,39 @@ def shape_graph_to_svg(shape, fill_styles, stroke_styles):
     return fill_g, stroke_g, extra_defs, all_paths, updaters
 
 
+# Symbols are usually rendered many times (e.g. once per frame), so we cache
+# the parsed styles of each <DOMShape>. The keys are weak references, so
+# elements can still be freed along with their document.
+STYLE_CACHE = weakref.WeakKeyDictionary()
+# Joining segments into shapes and formatting them is the slowest part of
+# conversion, so the path data of each <DOMShape> is cached the same way.
+PATH_DATA_CACHE = weakref.WeakKeyDictionary()
+
+
 def xfl_domshape_to_styles(domshape, document_dims):
+    cache = STYLE_CACHE.setdefault(domshape, {})
+    # Lists aren't hashable, so key on a tuple. Other values (SvgRenderer
+    # passes a bool here) are used as-is and still passed on unchanged.
+    key = tuple(document_dims) if isinstance(document_dims, list) else document_dims
+    if key in cache:
+        return cache[key]
+
+    # <FillStyle> and <StrokeStyle> elements are children of <fills> and
+    # <strokes>, which are children of <DOMShape>. So, we only look at those
+    # elements instead of searching the whole shape (including its edges).
     fill_styles = {}
-    for style in domshape.iterfind(".//{*}FillStyle"):
-        index = style.get("index")
-        fill_styles[index] = parse_fill_style(style[0], document_dims)
-
     stroke_styles = {}
-    for style in domshape.iterfind(".//{*}StrokeStyle"):
-        index = style.get("index")
-        stroke_styles[index] = parse_stroke_style(style[0], document_dims)
-
+    for child in domshape:
+        if child.tag.endswith("fills"):
+            for style in child:
+                index = style.get("index")
+                fill_styles[index] = parse_fill_style(style[0], document_dims)
+        elif child.tag.endswith("strokes"):
+            for style in child:
+                index = style.get("index")
+                stroke_styles[index] = parse_stroke_style(style[0], document_dims)
+
+    cache[key] = fill_styles, stroke_styles
     return fill_styles, stroke_styles
 
 
@@ -364,18 +421,28 @@ def xfl_domshape_to_svg(domshape, document_dims, mask=False):
         # TODO: Figure out how strokes are supposed to behave in masks
         fill_styles = defaultdict(lambda: {"fill": "#FFFFFF", "stroke": "none"})
         stroke_styles = defaultdict(lambda: {"fill": "#FFFFFF", "stroke": "none"})
-        shape_edges = xfl_domshape_to_edges(domshape)
     else:
         fill_styles, stroke_styles = xfl_domshape_to_styles(domshape, document_dims)
-        shape_edges = xfl_domshape_to_visible_edges(
-            domshape, fill_styles, stroke_styles
-        )
 
-    shape = ShapeGraph()
-    for edge in shape_edges:
-        shape.add_edge(*edge)
+    # The path data only depends on which styles are visible. The style
+    # indices don't change with `document_dims`, so `mask` is the only key.
+    cache = PATH_DATA_CACHE.setdefault(domshape, {})
+    mask = bool(mask)
+    if mask not in cache:
+        if mask:
+            shape_edges = xfl_domshape_to_edges(domshape)
+        else:
+            shape_edges = xfl_domshape_to_visible_edges(
+                domshape, fill_styles, stroke_styles
+            )
 
-    return shape_graph_to_svg(shape, fill_styles, stroke_styles)
+        shape = ShapeGraph()
+        for edge in shape_edges:
+            shape.add_edge(*edge)
+
+        cache[mask] = shape_graph_to_path_data(shape)
+
+    return path_data_to_svg(cache[mask], fill_styles, stroke_styles)
 
 
 def json_normalize_style(d):
@@ -8,9 +8,16 @@ CHARACTER_ENTITY_REFERENCE = re.compile(r"&#(\d+)")
 IDENTITY_MATRIX = ["1", "0", "0", "1", "0", "0"]
 
 
+def _unescape_entity(match):
+    return chr(int(match[1]))
+
+
 def unescape_entities(s):
     """Unescape XML character entity references."""
-    return CHARACTER_ENTITY_REFERENCE.sub(lambda m: chr(int(m[1])), s)
+    # Most names have no entities, so skip the regex for them
+    if "&#" not in s:
+        return s
+    return CHARACTER_ENTITY_REFERENCE.sub(_unescape_entity, s)
 
 
 def check_known_attrib(element, known):
@@ -52,6 +59,8 @@ def get_matrix(element):
 
 
 class Traceable:
+    __slots__ = ()
+
     def to_dict(self):
         raise NotImplementedError()
 